@@ -1,32 +1,190 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
 from django.contrib import admin
-from .models import Item, ItemImage, Loan, UserProfile
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .models import Item, ItemImage, Loan, LoanArchive, UserProfile
+
+
+class EstimatedCountPaginator(Paginator):
+    """Unfiltered changelists of big tables don't need an exact COUNT(*) on every page.
+
+    The estimate is only shown as the total: pages past it are still served
+    while they have rows, each page reads one extra row to know whether a
+    next page exists.
+    """
+
+    @cached_property
+    def estimated(self) -> bool:
+        qs = self.object_list
+        if qs.query.where:
+            return False
+        estimate = _estimated_rows(qs)
+        self._estimate = estimate
+        return estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD
+
+    @cached_property
+    def count(self):
+        if self.estimated:
+            return self._estimate
+        return super().count
+
+    @property
+    def num_pages(self):
+        pages = super().num_pages
+        return max(pages, getattr(self, "_pages_seen", 0)) if self.estimated else pages
+
+    def validate_number(self, number):
+        if not self.estimated:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self, number):
+        if not self.estimated:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage("That page contains no results")
+        self._pages_seen = number + (1 if len(rows) > self.per_page else 0)
+        return self._get_page(rows[:self.per_page], number, self)
+
+
+def _estimated_rows(qs):
+    connection = connections[qs.db]
+    table = qs.model._meta.db_table
+    if connection.vendor == "postgresql":
+        sql = "SELECT reltuples FROM pg_class WHERE oid = %s::regclass"
+    elif connection.vendor == "sqlite":
+        # row count as of the last ANALYZE, first number of any stat row of the table
+        sql = "SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 WHERE tbl = %s LIMIT 1"
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:  # sqlite_stat1 only exists after the first ANALYZE
+        return None
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+WORD_RE = re.compile(r"\w+")
+
+
+def _fts_query(term: str) -> str:
+    # every word as a prefix, all must match: "bosch fúr" -> "bosch"* "fúr"*
+    return " ".join(f'"{word}"*' for word in WORD_RE.findall(term))
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # (field, FTS5 table) pairs: on SQLite search matches `field IN (rowids matching the term)`.
+    # The tables (core_item_fts, core_user_fts) are kept up to date by triggers, see
+    # migration 0010. They fold case and accents, so "furo" finds "Bosch Fúrógép".
+    # Other backends fall back to the regular search_fields search.
+    fts_search = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        if not self.fts_search or connections[queryset.db].vendor != "sqlite":
+            return super().get_search_results(request, queryset, search_term)
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        match = _fts_query(term)
+        if not match:
+            return queryset.none(), False
+        conditions = [
+            Q(**{f"{field}__in": RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [match])})
+            for field, table in self.fts_search
+        ]
+        if term.isdigit():
+            conditions.append(Q(pk=int(term)))
+        return queryset.filter(reduce(or_, conditions)), False
+
 
 class ItemImageInline(admin.TabularInline):
     model = ItemImage
     extra = 0
 
 @admin.register(Item)
-class ItemAdmin(admin.ModelAdmin):
+class ItemAdmin(ScalableAdmin):
     list_display = ("id", "title", "owner", "category")
-    search_fields = ("title", "description", "category")
+    list_select_related = ("owner",)
+    search_fields = ("=id", "title", "category", "description")
+    fts_search = (("pk", "core_item_fts"),)
     inlines = [ItemImageInline]
 
 @admin.register(Loan)
-class LoanAdmin(admin.ModelAdmin):
+class LoanAdmin(ScalableAdmin):
     list_display = ("id", "item", "borrower", "state", "requested_at")
     list_filter = ("state",)
-    search_fields = ("item__title", "borrower__username")
+    list_select_related = ("item", "borrower")
+    search_fields = ("=id", "item__title", "=borrower__username")
+    fts_search = (("item_id", "core_item_fts"), ("borrower_id", "core_user_fts"))
+    actions = ["close_stale_loans"]
+
+    @admin.action(description="Elavult kölcsönkérések lezárása", permissions=["change"])
+    def close_stale_loans(self, request, queryset):
+        cutoff = timezone.now() - settings.ADMIN_STALE_LOAN_AGE
+        # one UPDATE: unanswered and never handed over loans become cancelled
+        closed = (
+            queryset
+            .filter(state__in=[Loan.State.REQUESTED, Loan.State.ACCEPTED])
+            .filter(Q(accepted_at__lt=cutoff) | Q(accepted_at__isnull=True, requested_at__lt=cutoff))
+            .update(state=Loan.State.CANCELLED, cancelled_at=timezone.now())
+        )
+        self.message_user(request, f"{closed} kölcsönzés lezárva.")
+
+@admin.register(LoanArchive)
+class LoanArchiveAdmin(ScalableAdmin):
+    list_display = ("id", "item", "borrower", "state", "requested_at", "archived_at")
+    list_filter = ("state",)
+    list_select_related = ("item", "borrower")
+    search_fields = ("=id", "item__title", "=borrower__username")
+    fts_search = (("item_id", "core_item_fts"), ("borrower_id", "core_user_fts"))
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(ScalableAdmin):
     list_display = ("user", "display_name", "phone", "verified")
+    list_filter = ("verified",)
+    list_select_related = ("user",)
     search_fields = ("user__username", "display_name", "phone")
+    fts_search = (("user_id", "core_user_fts"),)
     readonly_fields = ("user", "display_name", "phone")
+    actions = ["verify_profiles"]
 
     fields = ("user", "display_name", "phone", "avatar", "verified")
 
+    @admin.action(description="Kijelölt profilok hitelesítése", permissions=["change"])
+    def verify_profiles(self, request, queryset):
+        verified = queryset.filter(verified=False).update(verified=True)
+        self.message_user(request, f"{verified} profil hitelesítve.")
+
     def has_change_permission(self, request, obj=None):
         return request.user.is_staff
 
     def has_add_permission(self, request):
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,89 @@
+import heapq
+import logging
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ACTIVE_LOAN_STATES, Loan, LoanArchive
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FIELDS = [
+    "id", "item_id", "borrower_id", "state",
+    "requested_at", "accepted_at", "handed_over_at", "returned_at", "cancelled_at",
+    "expected_return_date",
+]
+
+
+def archivable_loans(older_than: timedelta | None = None):
+    """Finished loans whose last timestamp is older than `older_than`."""
+    if older_than is None:
+        older_than = timedelta(days=settings.LOAN_ARCHIVE_AFTER_DAYS)
+    cutoff = timezone.now() - older_than
+    # one branch per state so each can use its (state, timestamp) index;
+    # DECLINED has no own timestamp, so it goes by requested_at
+    return Loan.objects.filter(
+        Q(state=Loan.State.RETURNED, returned_at__lt=cutoff)
+        | Q(state=Loan.State.CANCELLED, cancelled_at__lt=cutoff)
+        | Q(state=Loan.State.DECLINED, requested_at__lt=cutoff)
+    )
+
+
+def archive_finished_loans(older_than: timedelta | None = None, batch_size: int | None = None) -> int:
+    """Move finished loans to LoanArchive in batches, one transaction per batch.
+
+    Loans whose id is already in the archive are left in place and logged,
+    so one bad row can't block every later run. Returns the number of moved loans.
+    """
+    if batch_size is None:
+        batch_size = settings.LOAN_ARCHIVE_BATCH_SIZE
+    moved = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                archivable_loans(older_than)
+                .filter(id__gt=last_id)
+                .select_for_update()
+                .order_by("id")
+                .values(*ARCHIVE_FIELDS)[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1]["id"]
+            ids = [row["id"] for row in batch]
+            conflicts = set(LoanArchive.objects.filter(id__in=ids).values_list("id", flat=True))
+            if conflicts:
+                logger.warning("Loans %s are already archived, left in the loan table.", sorted(conflicts))
+                batch = [row for row in batch if row["id"] not in conflicts]
+            LoanArchive.objects.bulk_create([LoanArchive(**row) for row in batch])
+            Loan.objects.filter(id__in=[row["id"] for row in batch]).delete()
+        moved += len(batch)
+    return moved
+
+
+def loan_history(limit: int | None = None, **filters):
+    """Hot and archived loans matching `filters`, newest first.
+
+    With `limit`, all active loans plus only the `limit` most recent finished
+    ones are returned; each table is ordered and cut in SQL, so the cost does
+    not grow with the archive.
+
+    Filters are plain field lookups valid on both tables (e.g. borrower=user,
+    item__owner=user). Archived rows expose the same attributes as Loan, so the
+    result can be rendered with the same templates.
+    """
+    hot = Loan.objects.filter(**filters).select_related("item__owner", "borrower").order_by("-requested_at")
+    cold = LoanArchive.objects.filter(**filters).select_related("item__owner", "borrower").order_by("-requested_at")
+    newest_first = dict(key=lambda loan: loan.requested_at, reverse=True)
+    if limit is None:
+        return list(heapq.merge(hot, cold, **newest_first))
+    active = list(hot.filter(state__in=ACTIVE_LOAN_STATES))
+    finished = heapq.merge(
+        hot.exclude(state__in=ACTIVE_LOAN_STATES)[:limit], cold[:limit], **newest_first,
+    )
+    return sorted(active + list(islice(finished, limit)), **newest_first)
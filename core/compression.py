@@ -0,0 +1,134 @@
+"""Compressed transfer of static files and HTML.
+
+- `CompressedManifestStaticFilesStorage` fingerprints files on collectstatic
+  and writes .gz and .br siblings (.br needs the `brotli` package from
+  requirements.txt, without it only .gz is written).
+- `PrecompressedStaticMiddleware` serves STATIC_ROOT picking the smallest
+  variant the client accepts, with far-future caching for fingerprinted names.
+- `CompressionMiddleware` gzips text and JSON responses, streaming ones
+  included, above `COMPRESS_MIN_SIZE` bytes.
+"""
+import gzip
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, HttpResponseNotModified
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODINGS = ((".br", "br"), (".gz", "gzip"))
+COMPRESSIBLE = (".css", ".js", ".mjs", ".map", ".svg", ".html", ".txt", ".json", ".xml", ".ico")
+HASHED_RE = re.compile(r"\.[0-9a-f]{12}\.")
+FAR_FUTURE = "public, max-age=31536000, immutable"
+# images, archives and other binary types are already compressed
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml", "image/svg+xml")
+
+
+def compressed_variants(data: bytes):
+    """(extension, encoding, payload) for every encoding that makes `data` smaller."""
+    variants = [(".gz", "gzip", gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((".br", "br", brotli.compress(data)))
+    return [v for v in variants if len(v[2]) < len(data)]
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # fall back to the plain name instead of failing when collectstatic wasn't run
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in list(self.hashed_files.values()) + list(paths):
+            if not name.endswith(COMPRESSIBLE) or not self.exists(name):
+                continue
+            # siblings of an earlier run would be served for content they no longer match
+            for ext, _ in ENCODINGS:
+                if self.exists(name + ext):
+                    self.delete(name + ext)
+            if self.size(name) < settings.COMPRESS_MIN_SIZE:
+                continue
+            with self.open(name) as f:
+                data = f.read()
+            for ext, _, payload in compressed_variants(data):
+                with open(self.path(name) + ext, "wb") as out:
+                    out.write(payload)
+
+
+def _accepted(request) -> set[str]:
+    header = request.headers.get("Accept-Encoding", "")
+    return {part.split(";")[0].strip() for part in header.split(",")}
+
+
+class PrecompressedStaticMiddleware:
+    """Serve STATIC_ROOT directly, preferring .br / .gz siblings."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self.root = os.path.realpath(settings.STATIC_ROOT)
+
+    def __call__(self, request):
+        if request.method in ("GET", "HEAD") and request.path.startswith(self.prefix):
+            response = self.serve(request, request.path[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def serve(self, request, name):
+        path = os.path.realpath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+            return None
+        mtime = os.stat(path).st_mtime
+        # fingerprinted names never change content, the rest must be revalidated
+        cache_control = FAR_FUTURE if HASHED_RE.search(os.path.basename(name)) else "public, max-age=0"
+        if not was_modified_since(request.META.get("HTTP_IF_MODIFIED_SINCE"), mtime):
+            response = HttpResponseNotModified()
+        else:
+            content_type, _ = mimetypes.guess_type(path)
+            encoding = None
+            accepted = _accepted(request)
+            for ext, enc in ENCODINGS:
+                if enc in accepted and os.path.isfile(path + ext):
+                    path, encoding = path + ext, enc
+                    break
+            response = FileResponse(
+                open(path, "rb"),
+                filename=os.path.basename(name),
+                content_type=content_type or "application/octet-stream",
+            )
+            if encoding:
+                response["Content-Encoding"] = encoding
+        response["Last-Modified"] = http_date(mtime)
+        if name.endswith(COMPRESSIBLE):
+            patch_vary_headers(response, ("Accept-Encoding",))
+        response["Cache-Control"] = cache_control
+        return response
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZipMiddleware limited to text / JSON responses of at least COMPRESS_MIN_SIZE bytes."""
+
+    def process_response(self, request, response):
+        content_type = response.get("Content-Type", "").split(";")[0].strip().lower()
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+        if response.streaming:
+            # FileResponse and friends announce their size
+            size = int(response.get("Content-Length") or settings.COMPRESS_MIN_SIZE)
+        else:
+            size = len(response.content)
+        if size < settings.COMPRESS_MIN_SIZE:
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.archive import archive_finished_loans
+
+
+class Command(BaseCommand):
+    help = (
+        "Move finished (returned, declined, cancelled) loans older than the given age "
+        "into the archive table. Meant to be run periodically, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=settings.LOAN_ARCHIVE_AFTER_DAYS,
+            help="Archive loans finished more than this many days ago.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.LOAN_ARCHIVE_BATCH_SIZE,
+            help="Number of loans moved per transaction.",
+        )
+
+    def handle(self, *args, days, batch_size, **options):
+        moved = archive_finished_loans(timedelta(days=days), batch_size)
+        if moved and connection.vendor == "sqlite":
+            # refresh sqlite_stat1, the admin's row estimates are read from it
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE core_loan")
+                cursor.execute("ANALYZE core_loanarchive")
+        self.stdout.write(self.style.SUCCESS(f"{moved} loan(s) archived."))
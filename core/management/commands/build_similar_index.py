@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.similar import apply_pending, build_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the similar items TF-IDF index from scratch, or with --pending only "
+        "patch it for items changed since the last run. Schedule both, e.g. --pending "
+        "every minute and a full rebuild nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--k", type=int, default=settings.SIMILAR_ITEMS_K,
+            help="Number of neighbours stored per item (full rebuild only).",
+        )
+        parser.add_argument(
+            "--pending", action="store_true",
+            help="Only apply queued item changes.",
+        )
+
+    def handle(self, *args, k, pending, **options):
+        if pending:
+            count = apply_pending()
+            self.stdout.write(self.style.SUCCESS(f"{count} changed item(s) applied."))
+            return
+        count = build_index(k)
+        self.stdout.write(self.style.SUCCESS(f"{count} item(s) indexed."))
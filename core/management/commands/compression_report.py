@@ -0,0 +1,69 @@
+import os
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from core.compression import COMPRESSIBLE, brotli
+
+
+class Command(BaseCommand):
+    help = "Report transfer size savings of precompressed static files and compressed HTML responses."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths", nargs="*", default=["/"],
+            help="Pages to fetch and compare with and without Accept-Encoding: gzip.",
+        )
+        parser.add_argument(
+            "--user",
+            help="Fetch the pages logged in as this user (for login-only pages like /loans/).",
+        )
+
+    def handle(self, *args, paths, user, **options):
+        self.report_static()
+        self.report_pages(paths, user)
+
+    def report_static(self):
+        raw = gz = br = count = 0
+        for dirpath, _, filenames in os.walk(settings.STATIC_ROOT):
+            for filename in filenames:
+                if not filename.endswith(COMPRESSIBLE):
+                    continue
+                path = os.path.join(dirpath, filename)
+                size = os.path.getsize(path)
+                count += 1
+                raw += size
+                gz += os.path.getsize(path + ".gz") if os.path.exists(path + ".gz") else size
+                br += os.path.getsize(path + ".br") if os.path.exists(path + ".br") else size
+        if not count:
+            self.stdout.write("static: no compressible files, run collectstatic first")
+            return
+        self.stdout.write(f"static: {count} files, {raw} B raw, {gz} B gzip ({self.saving(raw, gz)})")
+        if brotli is not None:
+            self.stdout.write(f"static: {br} B brotli ({self.saving(raw, br)})")
+
+    def report_pages(self, paths, username=None):
+        client = Client()
+        if username:
+            client.force_login(get_user_model().objects.get(username=username))
+        for path in paths:
+            plain = client.get(path)
+            if plain.status_code != 200:
+                self.stdout.write(f"{path}: skipped, status {plain.status_code}")
+                continue
+            compressed = client.get(path, HTTP_ACCEPT_ENCODING="gzip")
+            raw = len(self.body(plain))
+            sent = len(self.body(compressed))
+            self.stdout.write(f"{path}: {raw} B raw, {sent} B sent ({self.saving(raw, sent)})")
+
+    @staticmethod
+    def body(response):
+        if response.streaming:
+            return b"".join(response.streaming_content)
+        return response.content
+
+    @staticmethod
+    def saving(raw, sent):
+        return f"-{100 * (raw - sent) / raw:.1f}%" if raw else "n/a"
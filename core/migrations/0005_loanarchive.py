@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_userprofile_about_userprofile_address_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('state', models.CharField(choices=[('REQUESTED', 'Igénylve'), ('ACCEPTED', 'Elfoagdva'), ('HANDED_OVER', 'Átadva'), ('RETURNED', 'Visszaadva'), ('DECLINED', 'Elutasítva'), ('CANCELLED', 'Lemondva')], max_length=20)),
+                ('requested_at', models.DateTimeField()),
+                ('accepted_at', models.DateTimeField(blank=True, null=True)),
+                ('handed_over_at', models.DateTimeField(blank=True, null=True)),
+                ('returned_at', models.DateTimeField(blank=True, null=True)),
+                ('cancelled_at', models.DateTimeField(blank=True, null=True)),
+                ('expected_return_date', models.DateField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('borrower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to=settings.AUTH_USER_MODEL)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to='core.item')),
+            ],
+            options={
+                'verbose_name': 'Archivált kölcsönzés',
+                'verbose_name_plural': 'Archivált kölcsönzések',
+                'indexes': [models.Index(fields=['borrower', '-requested_at'], name='core_loanar_borrowe_fe7aa0_idx'), models.Index(fields=['item', '-requested_at'], name='core_loanar_item_id_b71479_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-19 15:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_loanarchive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='item',
+            name='category',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='title',
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_item_title_category_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['state', 'returned_at'], name='core_loan_state_db79e3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['state', 'cancelled_at'], name='core_loan_state_fbadd2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['state', 'requested_at'], name='core_loan_state_4467ec_idx'),
+        ),
+    ]
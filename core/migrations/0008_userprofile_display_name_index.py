@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_loan_archive_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='display_name',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+    ]
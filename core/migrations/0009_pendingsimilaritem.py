@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_userprofile_display_name_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingSimilarItem',
+            fields=[
+                ('item_id', models.BigIntegerField(primary_key=True, serialize=False)),
+            ],
+        ),
+    ]
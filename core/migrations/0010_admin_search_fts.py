@@ -0,0 +1,82 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:16
+
+from django.db import migrations, models
+
+# Admin search tables on SQLite, see ScalableAdmin.fts_search. The rowid is the
+# item / user id; triggers keep them in sync with the source tables.
+USER_ROW = (
+    "SELECT u.id, u.username, coalesce(p.display_name, ''), coalesce(p.phone, '') "
+    "FROM auth_user u LEFT JOIN core_userprofile p ON p.user_id = u.id"
+)
+
+CREATE_SQL = [
+    "CREATE VIRTUAL TABLE core_item_fts USING fts5("
+    "title, category, description, tokenize = 'unicode61 remove_diacritics 2')",
+    "INSERT INTO core_item_fts (rowid, title, category, description) "
+    "SELECT id, title, category, description FROM core_item",
+    "CREATE TRIGGER core_item_fts_ai AFTER INSERT ON core_item BEGIN "
+    "INSERT INTO core_item_fts (rowid, title, category, description) "
+    "VALUES (new.id, new.title, new.category, new.description); END",
+    "CREATE TRIGGER core_item_fts_au AFTER UPDATE ON core_item BEGIN "
+    "DELETE FROM core_item_fts WHERE rowid = old.id; "
+    "INSERT INTO core_item_fts (rowid, title, category, description) "
+    "VALUES (new.id, new.title, new.category, new.description); END",
+    "CREATE TRIGGER core_item_fts_ad AFTER DELETE ON core_item BEGIN "
+    "DELETE FROM core_item_fts WHERE rowid = old.id; END",
+
+    "CREATE VIRTUAL TABLE core_user_fts USING fts5("
+    "username, display_name, phone, tokenize = 'unicode61 remove_diacritics 2')",
+    f"INSERT INTO core_user_fts (rowid, username, display_name, phone) {USER_ROW}",
+    "CREATE TRIGGER core_user_fts_ai AFTER INSERT ON auth_user BEGIN "
+    f"INSERT INTO core_user_fts (rowid, username, display_name, phone) {USER_ROW} WHERE u.id = new.id; END",
+    "CREATE TRIGGER core_user_fts_au AFTER UPDATE ON auth_user BEGIN "
+    "DELETE FROM core_user_fts WHERE rowid = old.id; "
+    f"INSERT INTO core_user_fts (rowid, username, display_name, phone) {USER_ROW} WHERE u.id = new.id; END",
+    "CREATE TRIGGER core_user_fts_ad AFTER DELETE ON auth_user BEGIN "
+    "DELETE FROM core_user_fts WHERE rowid = old.id; END",
+]
+for event, ref in (("INSERT", "new"), ("UPDATE", "new"), ("DELETE", "old")):
+    CREATE_SQL.append(
+        f"CREATE TRIGGER core_userprofile_fts_{event[0].lower()} AFTER {event} ON core_userprofile BEGIN "
+        f"DELETE FROM core_user_fts WHERE rowid = {ref}.user_id; "
+        f"INSERT INTO core_user_fts (rowid, username, display_name, phone) {USER_ROW} WHERE u.id = {ref}.user_id; END"
+    )
+
+DROP_SQL = ["DROP TABLE IF EXISTS core_item_fts", "DROP TABLE IF EXISTS core_user_fts"]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0009_pendingsimilaritem'),
+    ]
+
+    operations = [
+        # search goes through the FTS tables (or a full scan elsewhere), these were unused
+        migrations.AlterField(
+            model_name='item',
+            name='category',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='title',
+            field=models.CharField(max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='display_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
@@ -1,6 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 User = get_user_model()
@@ -62,6 +62,19 @@ class Item(models.Model):
         # cover else first
         return self.cover_image() or self.images.first()
 
+class PendingSimilarItem(models.Model):
+    # items changed since the similar items index was last patched, see core/similar.py
+    item_id = models.BigIntegerField(primary_key=True)
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def queue_similar_items_refresh(sender, instance, raw=False, **kwargs):
+    # loaddata saves are raw, fixtures get indexed by a full build_similar_index
+    if raw:
+        return
+    # same transaction as the item change; one row per item, however often it changes
+    PendingSimilarItem.objects.bulk_create([PendingSimilarItem(item_id=instance.pk)], ignore_conflicts=True)
+
 class ItemImage(models.Model):
     item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="images")
     image = models.ImageField(upload_to="items/")
@@ -95,6 +108,14 @@ class Loan(models.Model):
 
     expected_return_date = models.DateField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # archive_loans selects finished loans by their final timestamp
+            models.Index(fields=["state", "returned_at"]),
+            models.Index(fields=["state", "cancelled_at"]),
+            models.Index(fields=["state", "requested_at"]),
+        ]
+
     def __str__(self) -> str:
         return f"Loan({self.item.title} -> {self.borrower.username}) [{self.state}]"
 
@@ -112,3 +133,54 @@ class Loan(models.Model):
 
     def can_mark_returned(self, user) -> bool:
         return user == self.item.owner and self.state == self.State.HANDED_OVER
+
+
+ACTIVE_LOAN_STATES = [
+    Loan.State.REQUESTED,
+    Loan.State.ACCEPTED,
+    Loan.State.HANDED_OVER,
+]
+
+class LoanArchive(models.Model):
+    # cold copy of finished loans, keeps the original Loan id
+    id = models.BigIntegerField(primary_key=True)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="archived_loans")
+    borrower = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_loans")
+    state = models.CharField(max_length=20, choices=Loan.State.choices)
+
+    requested_at = models.DateTimeField()
+    accepted_at = models.DateTimeField(null=True, blank=True)
+    handed_over_at = models.DateTimeField(null=True, blank=True)
+    returned_at = models.DateTimeField(null=True, blank=True)
+    cancelled_at = models.DateTimeField(null=True, blank=True)
+
+    expected_return_date = models.DateField(null=True, blank=True)
+
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Archivált kölcsönzés"
+        verbose_name_plural = "Archivált kölcsönzések"
+        indexes = [
+            models.Index(fields=["borrower", "-requested_at"]),
+            models.Index(fields=["item", "-requested_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"LoanArchive({self.item_id} -> {self.borrower_id}) [{self.state}]"
+
+    # archived loans are final, no transitions allowed
+    def can_accept(self, user) -> bool:
+        return False
+
+    def can_decline(self, user) -> bool:
+        return False
+
+    def can_cancel(self, user) -> bool:
+        return False
+
+    def can_hand_over(self, user) -> bool:
+        return False
+
+    def can_mark_returned(self, user) -> bool:
+        return False
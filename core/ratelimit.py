@@ -0,0 +1,212 @@
+"""Token bucket rate limiting per URL name.
+
+Limits come from `settings.RATELIMITS`, keyed by the url name in `core.urls`:
+
+    RATELIMITS = {
+        "loan_request": {"user": "10/m", "ip": "30/m"},
+        "loan_accept": {"user": "30/m", "methods": ("GET", "POST")},
+    }
+
+A rate "N/period" is a bucket of N tokens refilled evenly over the period
+(s, m, h or d). Anonymous requests are only limited by IP. Only the
+`methods` of an entry take tokens, by default the unsafe ones, so showing
+a form is never limited.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+UNSAFE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+def parse_rate(rate: str) -> tuple[int, float]:
+    """'10/m' -> (capacity 10, refill 10/60 tokens per second)"""
+    count, period = rate.split("/")
+    count = int(count)
+    return count, count / PERIODS[period[0]]
+
+
+def _consume(tokens: float, stamp: float, now: float, capacity: int, refill: float) -> tuple[float, float]:
+    """Refill the bucket up to `now` and take one token.
+
+    Returns (tokens left, seconds to wait); wait is 0 when the token was taken.
+    """
+    tokens = min(capacity, tokens + (now - stamp) * refill)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) / refill
+
+
+def _full_at(tokens: float, now: float, capacity: int, refill: float) -> float:
+    # from then on the bucket is indistinguishable from a missing one
+    return now + (capacity - tokens) / refill
+
+
+class MemoryBackend:
+    """Buckets in process memory, fine for a single worker / runserver.
+
+    Buckets that have refilled completely are swept every SWEEP_INTERVAL
+    seconds, so memory stays bounded by the clients of the last period.
+    """
+    SWEEP_INTERVAL = 60
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.swept = time.monotonic()
+
+    def take(self, key: str, capacity: int, refill: float) -> float:
+        """Take one token. Returns 0 if allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        with self.lock:
+            if now - self.swept >= self.SWEEP_INTERVAL:
+                self.buckets = {k: b for k, b in self.buckets.items() if b[2] > now}
+                self.swept = now
+            tokens, stamp, _ = self.buckets.get(key, (capacity, now, now))
+            tokens, wait = _consume(tokens, stamp, now, capacity, refill)
+            self.buckets[key] = (tokens, now, _full_at(tokens, now, capacity, refill))
+            return wait
+
+
+class CacheBackend:
+    """Fixed window counters in a Django cache, shared by every process using it.
+
+    Uses only `cache.add` and `cache.incr`, which are atomic on Redis,
+    Memcached and locmem (not on the database or file caches, use
+    SQLiteBackend there). A client may get up to twice the rate across a
+    window boundary.
+    """
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, "RATELIMIT_CACHE", "default")]
+
+    def take(self, key: str, capacity: int, refill: float) -> float:
+        now = time.time()
+        window = capacity / refill
+        current = int(now // window)
+        key = f"rl:{key}:{current}"
+        self.cache.add(key, 0, int(window) + 1)
+        try:
+            count = self.cache.incr(key)
+        except ValueError:  # expired between add and incr
+            self.cache.add(key, 1, int(window) + 1)
+            count = 1
+        if count <= capacity:
+            return 0
+        return (current + 1) * window - now
+
+
+class SQLiteBackend:
+    """Token buckets in a SQLite file shared by all processes on the host.
+
+    Every take is one BEGIN IMMEDIATE transaction, so concurrent workers
+    are serialised and the limit holds exactly.
+    """
+    SWEEP_INTERVAL = 60
+
+    def __init__(self):
+        self.path = str(getattr(settings, "RATELIMIT_SQLITE_PATH", settings.BASE_DIR / "ratelimit.sqlite3"))
+        self.local = threading.local()
+        self.swept = time.monotonic()
+
+    def _connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS bucket ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, stamp REAL NOT NULL, full_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS bucket_full_at ON bucket (full_at)")
+            self.local.conn = conn
+        return conn
+
+    def take(self, key: str, capacity: int, refill: float) -> float:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tokens, stamp FROM bucket WHERE key = ?", (key,)).fetchone()
+            tokens, stamp = row or (capacity, now)
+            tokens, wait = _consume(tokens, stamp, now, capacity, refill)
+            conn.execute(
+                "INSERT OR REPLACE INTO bucket (key, tokens, stamp, full_at) VALUES (?, ?, ?, ?)",
+                (key, tokens, now, _full_at(tokens, now, capacity, refill)),
+            )
+            if time.monotonic() - self.swept >= self.SWEEP_INTERVAL:
+                conn.execute("DELETE FROM bucket WHERE full_at <= ?", (now,))
+                self.swept = time.monotonic()
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+def _client_ip(request) -> str:
+    """Client address; behind RATELIMIT_PROXY_COUNT trusted proxies it is read
+    from RATELIMIT_PROXY_HEADER (X-Forwarded-For), counting from the right."""
+    proxies = getattr(settings, "RATELIMIT_PROXY_COUNT", 0)
+    if proxies:
+        header = request.META.get(getattr(settings, "RATELIMIT_PROXY_HEADER", "HTTP_X_FORWARDED_FOR"), "")
+        forwarded = [part.strip() for part in header.split(",") if part.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def too_many_requests(request, retry_after: float):
+    seconds = max(1, int(retry_after + 0.999))
+    message = f"Túl sok kérés, próbáld újra {seconds} másodperc múlva."
+    if request.headers.get("HX-Request"):
+        # keep the page as it is and let the client show the message
+        resp = HttpResponse(message, status=429, content_type="text/plain; charset=utf-8")
+        resp["HX-Reswap"] = "none"
+        resp["HX-Trigger"] = json.dumps({"rateLimited": {"message": message, "retryAfter": seconds}})
+    else:
+        resp = HttpResponse(f"<h1>429</h1><p>{message}</p>", status=429)
+    resp["Retry-After"] = str(seconds)
+    return resp
+
+
+class RateLimitMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.backend = import_string(
+            getattr(settings, "RATELIMIT_BACKEND", "core.ratelimit.MemoryBackend")
+        )()
+        self.limits = {}
+        for name, entry in getattr(settings, "RATELIMITS", {}).items():
+            scopes = {scope: parse_rate(rate) for scope, rate in entry.items() if scope != "methods"}
+            methods = {method.upper() for method in entry.get("methods", UNSAFE_METHODS)}
+            self.limits[name] = (scopes, methods)
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        scopes, methods = self.limits.get(match.url_name, (None, ())) if match else (None, ())
+        if not scopes or request.method not in methods:
+            return None
+        retry_after = 0
+        for scope, (capacity, refill) in scopes.items():
+            if scope == "user":
+                if not request.user.is_authenticated:
+                    continue
+                ident = f"u{request.user.pk}"
+            else:
+                ident = f"ip{_client_ip(request)}"
+            wait = self.backend.take(f"{match.url_name}:{ident}", capacity, refill)
+            retry_after = max(retry_after, wait)
+        if retry_after:
+            return too_many_requests(request, retry_after)
+        return None
@@ -0,0 +1,254 @@
+"""Similar items from a precomputed TF-IDF index.
+
+The index is a flat binary file that every worker memory-maps:
+
+    header      magic, k, n                    (16 bytes)
+    ids         n x int64, sorted item ids
+    neighbours  n x k x int64, 0 = empty slot
+    scores      n x k x float32, cosine similarity, descending
+
+A lookup is a binary search over `ids` plus reading one row, no DB and no
+vector math per request. Item saves only queue the item id in the
+PendingSimilarItem table; `manage.py build_similar_index --pending` (run it
+often, e.g. every minute from cron) patches the rows of those items, and
+`manage.py build_similar_index` recomputes everything. Writers hold an
+exclusive lock on `<index>.lock`, so concurrent runs never lose updates.
+"""
+import math
+import mmap
+import os
+import re
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: no locking
+    fcntl = None
+
+from .models import Item, PendingSimilarItem
+
+HEADER = struct.Struct("<4sIQ")
+MAGIC = b"TKSI"
+WORD_RE = re.compile(r"\w{2,}")
+
+
+# Vectors
+
+def _terms(title: str, description: str, category: str) -> Counter:
+    terms = Counter(WORD_RE.findall(title.lower()))
+    terms.update(terms)  # title counts double
+    terms.update(WORD_RE.findall(description.lower()))
+    if category:
+        terms["cat:" + category.strip().lower()] += 3
+    return terms
+
+
+def _vectors(rows) -> dict[int, dict[str, float]]:
+    """L2-normalised TF-IDF vectors keyed by item id."""
+    counts = {pk: _terms(title, description, category) for pk, title, description, category in rows}
+    df = Counter()
+    for terms in counts.values():
+        df.update(terms.keys())
+    n = len(counts)
+    vectors = {}
+    for pk, terms in counts.items():
+        vec = {t: (1 + math.log(c)) * math.log((1 + n) / (1 + df[t])) for t, c in terms.items()}
+        norm = math.sqrt(sum(w * w for w in vec.values()))
+        vectors[pk] = {t: w / norm for t, w in vec.items()} if norm else {}
+    return vectors
+
+
+def _catalogue():
+    return Item.objects.order_by("id").values_list("id", "title", "description", "category")
+
+
+def _scores_for(pk: int, vectors, postings) -> dict[int, float]:
+    scores = defaultdict(float)
+    for term, weight in vectors[pk].items():
+        for other, other_weight in postings.get(term, ()):
+            if other != pk:
+                scores[other] += weight * other_weight
+    return scores
+
+
+def _top(scores: dict[int, float], k: int) -> list[tuple[int, float]]:
+    return sorted(((pk, s) for pk, s in scores.items() if s > 0), key=lambda p: (-p[1], p[0]))[:k]
+
+
+def _postings(vectors):
+    """Inverted index term -> [(item id, weight)].
+
+    Terms found in more than SIMILAR_ITEMS_MAX_DF of the catalogue (a big
+    category, very common words) are left out: they add little to the
+    ranking but would make scoring quadratic.
+    """
+    postings = defaultdict(list)
+    for pk, vec in vectors.items():
+        for term, weight in vec.items():
+            postings[term].append((pk, weight))
+    limit = max(settings.SIMILAR_ITEMS_MIN_POSTINGS, int(settings.SIMILAR_ITEMS_MAX_DF * len(vectors)))
+    return {term: plist for term, plist in postings.items() if len(plist) <= limit}
+
+
+# File IO
+
+@contextmanager
+def _locked(path):
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield f
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _drain_pending() -> set[int]:
+    # read before the catalogue, so changes queued meanwhile are picked up next run
+    pks = set(PendingSimilarItem.objects.values_list("item_id", flat=True))
+    PendingSimilarItem.objects.filter(item_id__in=pks).delete()
+    return pks
+
+
+def _write(path, rows: dict[int, list[tuple[int, float]]], k: int):
+    ids = array("q", sorted(rows))
+    neighbours = array("q")
+    scores = array("f")
+    for pk in ids:
+        row = rows[pk][:k]
+        neighbours.extend(other for other, _ in row)
+        neighbours.extend([0] * (k - len(row)))
+        scores.extend(score for _, score in row)
+        scores.extend([0.0] * (k - len(row)))
+
+    # write next to the target and swap in atomically, readers keep their old mapping
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".similar-")
+    with os.fdopen(fd, "wb") as f:
+        f.write(HEADER.pack(MAGIC, k, len(ids)))
+        ids.tofile(f)
+        neighbours.tofile(f)
+        scores.tofile(f)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+class _Index:
+    def __init__(self, path):
+        self.mtime = os.stat(path).st_mtime_ns
+        with open(path, "rb") as f:
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.k, self.n = HEADER.unpack_from(self.buf)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a similar items index")
+        view = memoryview(self.buf)
+        start = HEADER.size
+        end = start + 8 * self.n
+        self.ids = view[start:end].cast("q")
+        start, end = end, end + 8 * self.n * self.k
+        self.neighbours = view[start:end].cast("q")
+        start, end = end, end + 4 * self.n * self.k
+        self.scores = view[start:end].cast("f")
+
+    def row(self, pk: int) -> list[tuple[int, float]]:
+        i = bisect_left(self.ids, pk)
+        if i == len(self.ids) or self.ids[i] != pk:
+            return []
+        base = i * self.k
+        return [
+            (self.neighbours[j], self.scores[j])
+            for j in range(base, base + self.k)
+            if self.neighbours[j]
+        ]
+
+    def rows(self) -> dict[int, list[tuple[int, float]]]:
+        return {pk: self.row(pk) for pk in self.ids}
+
+
+_index = None
+
+
+def _load():
+    """Per-process mapping of the index, remapped when the file is replaced."""
+    global _index
+    path = settings.SIMILAR_ITEMS_INDEX
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        _index = None
+        return None
+    if _index is None or _index.mtime != mtime:
+        _index = _Index(path)
+    return _index
+
+
+# Public API
+
+def build_index(k: int | None = None) -> int:
+    """Recompute the whole index. Returns the number of indexed items."""
+    k = k or settings.SIMILAR_ITEMS_K
+    with _locked(settings.SIMILAR_ITEMS_INDEX + ".lock"):
+        # everything queued so far is covered by the full rebuild
+        _drain_pending()
+        vectors = _vectors(_catalogue())
+        postings = _postings(vectors)
+        rows = {pk: _top(_scores_for(pk, vectors, postings), k) for pk in vectors}
+        _write(settings.SIMILAR_ITEMS_INDEX, rows, k)
+    return len(rows)
+
+
+def apply_pending() -> int:
+    """Patch the index for items queued in PendingSimilarItem. Returns their number.
+
+    Only the rows of the changed items and their score in other rows are
+    recomputed; other pairs keep their stored scores until the next full
+    `build_index`.
+    """
+    if _load() is None:
+        build_index()
+        return 0
+    with _locked(settings.SIMILAR_ITEMS_INDEX + ".lock"):
+        changed = _drain_pending()
+        if not changed:
+            return 0
+        index = _load()
+        k = index.k
+        rows = index.rows()
+        # drop changed items from every row, they are re-added below where they still fit
+        for other, row in rows.items():
+            rows[other] = [(n, s) for n, s in row if n not in changed]
+
+        vectors = _vectors(_catalogue())
+        postings = _postings(vectors)
+        for pk in changed:
+            rows.pop(pk, None)
+            if pk not in vectors:
+                continue
+            scores = _scores_for(pk, vectors, postings)
+            rows[pk] = _top(scores, k)
+            for other, score in scores.items():
+                if other in changed or other not in rows:
+                    continue
+                row = rows[other]
+                if len(row) < k or score > row[-1][1]:
+                    rows[other] = _top(dict(row) | {pk: score}, k)
+        _write(settings.SIMILAR_ITEMS_INDEX, rows, k)
+    return len(changed)
+
+
+def similar_item_ids(pk: int) -> list[int]:
+    index = _load()
+    return [other for other, _ in index.row(pk)] if index else []
+
+
+def similar_items(item, limit: int | None = None) -> list:
+    ids = similar_item_ids(item.pk)[:limit]
+    by_id = Item.objects.in_bulk(ids)
+    return [by_id[i] for i in ids if i in by_id]
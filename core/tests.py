@@ -0,0 +1,320 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.paginator import EmptyPage
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from . import ratelimit, similar
+from .admin import EstimatedCountPaginator
+from .archive import archive_finished_loans, loan_history
+from .compression import CompressionMiddleware
+from .models import Item, Loan, LoanArchive, UserProfile
+
+User = get_user_model()
+
+
+class LoanArchiveTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username="owner")
+        self.borrower = User.objects.create(username="borrower")
+        self.item = Item.objects.create(owner=self.owner, title="Fúrógép")
+        old = timezone.now() - timedelta(days=400)
+        self.returned = self._loan(Loan.State.RETURNED, returned_at=old)
+        self.cancelled = self._loan(Loan.State.CANCELLED, cancelled_at=old)
+        self.declined = self._loan(Loan.State.DECLINED, requested_at=old)
+        self.recent = self._loan(Loan.State.RETURNED, returned_at=timezone.now())
+        self.active = self._loan(Loan.State.HANDED_OVER)
+
+    def _loan(self, state, requested_at=None, **fields):
+        loan = Loan.objects.create(item=self.item, borrower=self.borrower, state=state, **fields)
+        if requested_at:
+            Loan.objects.filter(pk=loan.pk).update(requested_at=requested_at)
+        return loan
+
+    def _history(self):
+        return [(loan.pk, loan.state, loan.requested_at) for loan in loan_history(borrower=self.borrower)]
+
+    def test_moves_old_finished_loans_only(self):
+        self.assertEqual(archive_finished_loans(timedelta(days=180), batch_size=2), 3)
+        self.assertEqual(
+            set(LoanArchive.objects.values_list("pk", flat=True)),
+            {self.returned.pk, self.cancelled.pk, self.declined.pk},
+        )
+        self.assertEqual(
+            set(Loan.objects.values_list("pk", flat=True)),
+            {self.recent.pk, self.active.pk},
+        )
+        self.assertEqual(archive_finished_loans(timedelta(days=180)), 0)
+
+    def test_history_is_unchanged_by_archiving(self):
+        before = self._history()
+        archive_finished_loans(timedelta(days=180), batch_size=1)
+        self.assertEqual(self._history(), before)
+        self.assertEqual(
+            [loan.pk for loan in loan_history(item__owner=self.owner)],
+            [pk for pk, _, _ in before],
+        )
+
+    def test_archived_loans_allow_no_transitions(self):
+        archive_finished_loans(timedelta(days=180))
+        archived = LoanArchive.objects.get(pk=self.returned.pk)
+        self.assertFalse(archived.can_cancel(self.borrower))
+        self.assertFalse(archived.can_accept(self.owner))
+
+    def test_id_conflict_is_skipped_and_logged(self):
+        LoanArchive.objects.create(
+            id=self.returned.pk, item=self.item, borrower=self.borrower,
+            state=Loan.State.DECLINED, requested_at=timezone.now(),
+        )
+        with self.assertLogs("core.archive", "WARNING"):
+            self.assertEqual(archive_finished_loans(timedelta(days=180)), 2)
+        self.assertTrue(Loan.objects.filter(pk=self.returned.pk).exists())
+        self.assertFalse(Loan.objects.filter(pk__in=[self.cancelled.pk, self.declined.pk]).exists())
+
+    def test_limited_history_keeps_active_loans(self):
+        archive_finished_loans(timedelta(days=180))
+        history = loan_history(1, borrower=self.borrower)
+        self.assertEqual([loan.pk for loan in history], [self.active.pk, self.recent.pk])
+
+
+class SimilarItemsTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        override = override_settings(SIMILAR_ITEMS_INDEX=os.path.join(tmp, "similar.idx"), SIMILAR_ITEMS_K=3)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.owner = User.objects.create(username="owner")
+        self.drill = self._item("Bosch fúrógép", "szerszám", "ütvefúró")
+        self.cordless = self._item("Akkus fúrógép", "szerszám")
+        self.tent = self._item("Sátor", "kemping", "négyszemélyes sátor")
+
+    def _item(self, title, category, description=""):
+        return Item.objects.create(owner=self.owner, title=title, category=category, description=description)
+
+    def test_build_and_lookup(self):
+        self.assertEqual(similar.build_index(), 3)
+        self.assertEqual(similar.similar_item_ids(self.drill.pk), [self.cordless.pk])
+        self.assertEqual(similar.similar_item_ids(self.tent.pk), [])
+        self.assertEqual(similar.similar_item_ids(999), [])
+        self.assertEqual(similar.similar_items(self.cordless), [self.drill])
+
+    def test_saves_are_queued_until_applied(self):
+        similar.build_index()
+        screwdriver = self._item("Bosch csavarhúzó", "szerszám")
+        self.assertEqual(similar.similar_item_ids(screwdriver.pk), [])
+
+        self.assertEqual(similar.apply_pending(), 1)
+        self.assertEqual(set(similar.similar_item_ids(screwdriver.pk)), {self.drill.pk, self.cordless.pk})
+        self.assertIn(screwdriver.pk, similar.similar_item_ids(self.drill.pk))
+        self.assertEqual(similar.apply_pending(), 0)
+
+    def test_delete_removes_item_from_index(self):
+        similar.build_index()
+        deleted_pk = self.cordless.pk
+        self.cordless.delete()
+        self.assertEqual(similar.apply_pending(), 1)
+        self.assertEqual(similar.similar_item_ids(self.drill.pk), [])
+        self.assertEqual(similar.similar_item_ids(deleted_pk), [])
+
+    def test_raw_saves_are_not_queued(self):
+        similar.build_index()
+        now = timezone.now()
+        Item(owner=self.owner, title="Fixture", created_at=now, updated_at=now).save_base(raw=True)
+        self.assertEqual(similar.apply_pending(), 0)
+
+    def test_full_rebuild_clears_queue(self):
+        similar.build_index()
+        self._item("Bosch csavarhúzó", "szerszám")
+        similar.build_index()
+        self.assertEqual(similar.apply_pending(), 0)
+
+
+class AdminSearchTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username="Owner")
+        self.owner.profile.display_name = "Kovács Éva"
+        self.owner.profile.phone = "+36301234567"
+        self.owner.profile.save()
+        self.drill = Item.objects.create(owner=self.owner, title="Bosch fúrógép", category="Szerszám")
+        self.drum = Item.objects.create(owner=self.owner, title="drum", category="music")
+        self.loan = Loan.objects.create(item=self.drill, borrower=self.owner)
+        self.request = RequestFactory().get("/")
+
+    def _search(self, model, term):
+        qs, may_have_duplicates = admin.site._registry[model].get_search_results(
+            self.request, model.objects.all(), term,
+        )
+        self.assertFalse(may_have_duplicates)
+        return set(qs)
+
+    def test_words_case_and_accents(self):
+        self.assertEqual(self._search(Item, "FÚRÓ"), {self.drill})
+        self.assertEqual(self._search(Item, "furogep"), {self.drill})
+        self.assertEqual(self._search(Item, "bosch fúr"), {self.drill})
+        self.assertEqual(self._search(Item, "szerszam"), {self.drill})
+        self.assertEqual(self._search(Item, "Music"), {self.drum})
+        self.assertEqual(self._search(Item, str(self.drum.pk)), {self.drum})
+        self.assertEqual(self._search(Item, "nothing"), set())
+
+    def test_index_follows_changes(self):
+        self.drum.title = "Makita ütvefúró"
+        self.drum.save()
+        self.assertEqual(self._search(Item, "makita"), {self.drum})
+        self.assertEqual(self._search(Item, "drum"), set())
+        self.drill.delete()
+        self.assertEqual(self._search(Item, "bosch"), set())
+
+    def test_related_fields(self):
+        self.assertEqual(self._search(Loan, "fúrógép"), {self.loan})
+        self.assertEqual(self._search(Loan, "owner"), {self.loan})
+        self.assertEqual(self._search(Loan, "drum"), set())
+        self.assertEqual(self._search(UserProfile, "owner"), {self.owner.profile})
+        self.assertEqual(self._search(UserProfile, "eva"), {self.owner.profile})
+        self.assertEqual(self._search(UserProfile, "36301234567"), {self.owner.profile})
+
+    @override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=1)
+    def test_pages_past_a_stale_estimate(self):
+        for i in range(10):
+            Item.objects.create(owner=self.owner, title=f"item {i}")
+        with mock.patch("core.admin._estimated_rows", return_value=3):
+            paginator = EstimatedCountPaginator(Item.objects.order_by("pk"), 2)
+            self.assertEqual(paginator.count, 3)
+            page = paginator.page(4)
+            self.assertEqual(len(page.object_list), 2)
+            self.assertTrue(page.has_next())
+            self.assertEqual(paginator.page(6).object_list[-1].title, "item 9")
+            self.assertFalse(paginator.page(6).has_next())
+            with self.assertRaises(EmptyPage):
+                paginator.page(7)
+
+
+class RateLimitTests(TestCase):
+    def test_bucket_refills(self):
+        backend = ratelimit.MemoryBackend()
+        capacity, refill = ratelimit.parse_rate("2/m")
+        with mock.patch("core.ratelimit.time.monotonic", return_value=1000.0):
+            self.assertEqual(backend.take("k", capacity, refill), 0)
+            self.assertEqual(backend.take("k", capacity, refill), 0)
+            self.assertAlmostEqual(backend.take("k", capacity, refill), 30)
+        with mock.patch("core.ratelimit.time.monotonic", return_value=1030.0):
+            self.assertEqual(backend.take("k", capacity, refill), 0)
+            self.assertGreater(backend.take("k", capacity, refill), 0)
+
+    def test_memory_backend_sweeps_full_buckets(self):
+        backend = ratelimit.MemoryBackend()
+        with mock.patch("core.ratelimit.time.monotonic", return_value=backend.swept):
+            backend.take("a", 2, 1)
+        with mock.patch("core.ratelimit.time.monotonic", return_value=backend.swept + 3600):
+            backend.take("b", 2, 1)
+        self.assertEqual(set(backend.buckets), {"b"})
+
+    def test_sqlite_backend_is_shared(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        with override_settings(RATELIMIT_SQLITE_PATH=os.path.join(tmp, "rl.sqlite3")):
+            first, second = ratelimit.SQLiteBackend(), ratelimit.SQLiteBackend()
+        self.assertEqual(first.take("k", 2, 0.01), 0)
+        self.assertEqual(second.take("k", 2, 0.01), 0)
+        self.assertGreater(first.take("k", 2, 0.01), 0)
+        self.assertGreater(second.take("k", 2, 0.01), 0)
+
+    def test_cache_backend_counts_atomically(self):
+        backend = ratelimit.CacheBackend()
+        backend.cache.clear()
+        results = [backend.take("k", 3, 3 / 3600) for _ in range(4)]
+        self.assertEqual(results[:3], [0, 0, 0])
+        self.assertGreater(results[3], 0)
+
+    @override_settings(RATELIMITS={"register": {"ip": "2/h"}})
+    def test_429_with_retry_after(self):
+        client = Client()
+        self.assertEqual(client.post("/register/").status_code, 200)
+        self.assertEqual(client.post("/register/").status_code, 200)
+        response = client.post("/register/")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(int(response["Retry-After"]), 1800)
+
+        response = client.post("/register/", HTTP_HX_REQUEST="true")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["HX-Reswap"], "none")
+        self.assertIn("rateLimited", response["HX-Trigger"])
+        # showing the form is not limited
+        self.assertEqual(client.get("/register/").status_code, 200)
+        # other clients have their own bucket
+        self.assertEqual(client.post("/register/", REMOTE_ADDR="10.0.0.2").status_code, 200)
+
+    @override_settings(RATELIMIT_PROXY_COUNT=1)
+    def test_client_ip_behind_proxy(self):
+        request = RequestFactory().get("/", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="1.2.3.4, 5.6.7.8")
+        self.assertEqual(ratelimit._client_ip(request), "5.6.7.8")
+        request = RequestFactory().get("/", REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(ratelimit._client_ip(request), "10.0.0.1")
+
+
+@override_settings(COMPRESS_MIN_SIZE=10)
+class CompressionTests(TestCase):
+    def _compress(self, response):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip")
+        return CompressionMiddleware(lambda r: response)(request)
+
+    def test_html_is_gzipped(self):
+        response = self._compress(HttpResponse("<p>kölcsönzés</p>" * 20))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    def test_small_and_binary_responses_are_left_alone(self):
+        self.assertFalse(self._compress(HttpResponse("<p></p>")).has_header("Content-Encoding"))
+        image = StreamingHttpResponse([b"\xff\xd8" * 100], content_type="image/jpeg")
+        self.assertFalse(self._compress(image).has_header("Content-Encoding"))
+
+    def test_collectstatic_replaces_stale_siblings(self):
+        src, root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, src)
+        self.addCleanup(shutil.rmtree, root)
+        with open(os.path.join(src, "app.js"), "w") as f:
+            f.write("x")  # below COMPRESS_MIN_SIZE now
+        for ext in (".gz", ".br"):
+            with open(os.path.join(root, "app.js" + ext), "wb") as f:
+                f.write(b"stale")
+        with override_settings(STATIC_ROOT=root, STATICFILES_DIRS=[src]):
+            call_command("collectstatic", interactive=False, verbosity=0)
+        self.assertFalse(os.path.exists(os.path.join(root, "app.js.gz")))
+        self.assertFalse(os.path.exists(os.path.join(root, "app.js.br")))
+
+
+class LoanTransitionTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username="owner")
+        self.borrower = User.objects.create(username="borrower")
+        self.item = Item.objects.create(owner=self.owner, title="Fúrógép")
+        self.loan = Loan.objects.create(item=self.item, borrower=self.borrower)
+        self.client.force_login(self.owner)
+
+    def test_htmx_returns_card_with_oob_counts(self):
+        response = self.client.post(f"/loans/{self.loan.pk}/accept/", HTTP_HX_REQUEST="true")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'id="loan-{self.loan.pk}"')
+        self.assertContains(response, 'id="loan-count-owner"')
+        self.assertContains(response, "Kölcsönkérés elfogadva.")
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.state, Loan.State.ACCEPTED)
+
+    def test_plain_request_redirects(self):
+        response = self.client.get(f"/loans/{self.loan.pk}/accept/")
+        self.assertRedirects(response, "/loans/")
+
+    def test_outsider_gets_403_without_queued_message(self):
+        outsider = User.objects.create(username="outsider")
+        self.client.force_login(outsider)
+        response = self.client.post(f"/loans/{self.loan.pk}/accept/", HTTP_HX_REQUEST="true")
+        self.assertEqual(response.status_code, 403)
+        self.assertIn("showMessage", response["HX-Trigger"])
+        self.assertEqual(list(self.client.get("/loans/").context["messages"]), [])
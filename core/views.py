@@ -1,3 +1,5 @@
+import json
+
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login
@@ -9,8 +11,11 @@ from django.http import HttpResponseBadRequest, HttpResponse
 from django.views.decorators.http import require_POST
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.conf import settings
 
-from .models import Item, ItemImage, Loan
+from .models import ACTIVE_LOAN_STATES, Item, ItemImage, Loan
+from .archive import loan_history
+from .similar import similar_items
 from .forms import ItemForm, ItemImageForm, RegisterForm, UserProfileForm
 
 # Items
@@ -91,6 +96,7 @@ def item_detail(request, pk: int):
         "img_form": img_form,
         "main_image": main_image,
         "gallery": gallery,
+        "similar_items": similar_items(item, settings.SIMILAR_ITEMS_SHOWN),
     })
 
 @login_required
@@ -153,13 +159,41 @@ def item_image_delete_hx(request, pk: int, image_id: int):
 
 @login_required
 def my_loans(request):
-    loans_as_borrower = Loan.objects.filter(borrower=request.user).order_by("-requested_at")
-    loans_as_owner = Loan.objects.filter(item__owner=request.user).order_by("-requested_at")
+    # active loans and the most recent finished ones, older history stays in the archive
+    loans_as_borrower = loan_history(settings.LOAN_HISTORY_SHOWN, borrower=request.user)
+    loans_as_owner = loan_history(settings.LOAN_HISTORY_SHOWN, item__owner=request.user)
     return render(request, "loans/my_loans.html", {
         "loans_as_borrower": loans_as_borrower,
         "loans_as_owner": loans_as_owner,
+        **_loan_counts(request.user),
     })
 
+def _loan_counts(user):
+    active = Loan.objects.filter(state__in=ACTIVE_LOAN_STATES)
+    return {
+        "active_as_borrower": active.filter(borrower=user).count(),
+        "active_as_owner": active.filter(item__owner=user).count(),
+    }
+
+def _loan_response(request, loan):
+    # HTMX: only the changed card, counts and messages go out of band
+    if request.headers.get("HX-Request"):
+        html = render_to_string("loans/partials/loan_card_hx.html", {
+            "loan": loan,
+            **_loan_counts(request.user),
+        }, request=request)
+        return HttpResponse(html)
+    return redirect("core:my_loans")
+
+def _loan_denied(request, loan):
+    # outsiders must not get the card; htmx doesn't swap a 403, so the message goes in HX-Trigger
+    if request.headers.get("HX-Request") and request.user not in (loan.borrower, loan.item.owner):
+        resp = HttpResponse(status=403)
+        resp["HX-Trigger"] = json.dumps({"showMessage": {"message": "Nincs jogosultság."}})
+        return resp
+    messages.error(request, "Nincs jogosultság.")
+    return _loan_response(request, loan)
+
 @login_required
 def loan_request(request, item_id: int):
     item = get_object_or_404(Item, pk=item_id)
@@ -175,62 +209,57 @@ def loan_request(request, item_id: int):
 
 @login_required
 def loan_accept(request, loan_id: int):
-    loan = get_object_or_404(Loan, pk=loan_id)
+    loan = get_object_or_404(Loan.objects.select_related("item__owner", "borrower"), pk=loan_id)
     if not loan.can_accept(request.user):
-        messages.error(request, "Nincs jogosultság.")
-        return redirect("core:my_loans")
+        return _loan_denied(request, loan)
     loan.state = Loan.State.ACCEPTED
     loan.accepted_at = timezone.now()
     loan.save()
     messages.success(request, "Kölcsönkérés elfogadva.")
-    return redirect("core:my_loans")
+    return _loan_response(request, loan)
 
 @login_required
 def loan_decline(request, loan_id: int):
-    loan = get_object_or_404(Loan, pk=loan_id)
+    loan = get_object_or_404(Loan.objects.select_related("item__owner", "borrower"), pk=loan_id)
     if not loan.can_decline(request.user):
-        messages.error(request, "Nincs jogosultság.")
-        return redirect("core:my_loans")
+        return _loan_denied(request, loan)
     loan.state = Loan.State.DECLINED
     loan.save()
     messages.success(request, "Kölcsönkérés elutasítva.")
-    return redirect("core:my_loans")
+    return _loan_response(request, loan)
 
 @login_required
 def loan_cancel(request, loan_id: int):
-    loan = get_object_or_404(Loan, pk=loan_id)
+    loan = get_object_or_404(Loan.objects.select_related("item__owner", "borrower"), pk=loan_id)
     if not loan.can_cancel(request.user):
-        messages.error(request, "Nincs jogosultság.")
-        return redirect("core:my_loans")
+        return _loan_denied(request, loan)
     loan.state = Loan.State.CANCELLED
     loan.cancelled_at = timezone.now()
     loan.save()
     messages.success(request, "Kölcsönkérés lemondva.")
-    return redirect("core:my_loans")
+    return _loan_response(request, loan)
 
 @login_required
 def loan_hand_over(request, loan_id: int):
-    loan = get_object_or_404(Loan, pk=loan_id)
+    loan = get_object_or_404(Loan.objects.select_related("item__owner", "borrower"), pk=loan_id)
     if not loan.can_hand_over(request.user):
-        messages.error(request, "Nincs jogosultság.")
-        return redirect("core:my_loans")
+        return _loan_denied(request, loan)
     loan.state = Loan.State.HANDED_OVER
     loan.handed_over_at = timezone.now()
     loan.save()
     messages.success(request, "Átadás rögzítve.")
-    return redirect("core:my_loans")
+    return _loan_response(request, loan)
 
 @login_required
 def loan_mark_returned(request, loan_id: int):
-    loan = get_object_or_404(Loan, pk=loan_id)
+    loan = get_object_or_404(Loan.objects.select_related("item__owner", "borrower"), pk=loan_id)
     if not loan.can_mark_returned(request.user):
-        messages.error(request, "Nincs jogosultság.")
-        return redirect("core:my_loans")
+        return _loan_denied(request, loan)
     loan.state = Loan.State.RETURNED
     loan.returned_at = timezone.now()
     loan.save()
     messages.success(request, "Visszahozatal rögzítve.")
-    return redirect("core:my_loans")
+    return _loan_response(request, loan)
 
 # Registration
 
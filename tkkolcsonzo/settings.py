@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+from datetime import timedelta
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -19,12 +20,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "core.compression.PrecompressedStaticMiddleware",
+    "core.compression.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.ratelimit.RateLimitMiddleware",
 ]
 
 ROOT_URLCONF = "tkkolcsonzo.urls"
@@ -68,6 +72,14 @@ USE_TZ = True
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "static"
 
+# `manage.py collectstatic` fingerprints files and writes .gz/.br siblings, see core/compression.py
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "core.compression.CompressedManifestStaticFilesStorage"},
+}
+# static files and responses smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = 512
+
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
@@ -75,3 +87,45 @@ LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Finished loans older than this are moved to the archive table by `manage.py archive_loans`
+LOAN_ARCHIVE_AFTER_DAYS = int(os.environ.get("LOAN_ARCHIVE_AFTER_DAYS", "180"))
+LOAN_ARCHIVE_BATCH_SIZE = int(os.environ.get("LOAN_ARCHIVE_BATCH_SIZE", "500"))
+# finished loans listed per role on the my_loans dashboard
+LOAN_HISTORY_SHOWN = 20
+
+# Precomputed similar items index. Item changes are queued and applied by
+# `manage.py build_similar_index --pending` (cron, every minute); run it without
+# --pending (e.g. nightly) for a full rebuild.
+SIMILAR_ITEMS_INDEX = os.environ.get("SIMILAR_ITEMS_INDEX", str(BASE_DIR / "similar_items.idx"))
+SIMILAR_ITEMS_K = 12
+SIMILAR_ITEMS_SHOWN = 6
+# terms in more than this share of the items (but at least MIN_POSTINGS) are not scored
+SIMILAR_ITEMS_MAX_DF = 0.05
+SIMILAR_ITEMS_MIN_POSTINGS = 50
+
+# Admin changelists show an estimated total above this many rows
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 10_000
+# "Close stale loans" admin action only touches loans idle longer than this
+ADMIN_STALE_LOAN_AGE = timedelta(days=int(os.environ.get("ADMIN_STALE_LOAN_AGE_DAYS", "30")))
+
+# Token buckets per url name, see core/ratelimit.py. With several worker processes use
+# "core.ratelimit.SQLiteBackend" (one host) or "core.ratelimit.CacheBackend" with Redis/Memcached.
+RATELIMIT_BACKEND = os.environ.get("RATELIMIT_BACKEND", "core.ratelimit.MemoryBackend")
+RATELIMIT_SQLITE_PATH = BASE_DIR / "ratelimit.sqlite3"
+# Number of reverse proxies in front of the app that append to X-Forwarded-For (0: use REMOTE_ADDR)
+RATELIMIT_PROXY_COUNT = int(os.environ.get("RATELIMIT_PROXY_COUNT", "0"))
+RATELIMIT_PROXY_HEADER = "HTTP_X_FORWARDED_FOR"
+# Entries limit unsafe methods only unless they list "methods"; the loan
+# transitions also change state on GET (the buttons are plain links without JS).
+_LOAN_TRANSITION_LIMIT = {"user": "30/m", "ip": "60/m", "methods": ("GET", "POST")}
+RATELIMITS = {
+    "loan_request": {"user": "10/m", "ip": "30/m"},
+    "register": {"ip": "10/h"},
+    "item_image_add_hx": {"user": "20/m", "ip": "40/m"},
+    "loan_accept": _LOAN_TRANSITION_LIMIT,
+    "loan_decline": _LOAN_TRANSITION_LIMIT,
+    "loan_cancel": _LOAN_TRANSITION_LIMIT,
+    "loan_hand_over": _LOAN_TRANSITION_LIMIT,
+    "loan_mark_returned": _LOAN_TRANSITION_LIMIT,
+}